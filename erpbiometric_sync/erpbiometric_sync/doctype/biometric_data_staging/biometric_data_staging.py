@@ -5,6 +5,22 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import now
 
+# Number of staging logs processed per batch
+BATCH_SIZE = 1000
+
+# Number of parallel jobs enqueued by enqueue_process_biometric_logs
+SYNC_SHARDS = 4
+
+# Roles that receive the exceptional report
+REPORT_ROLES = ("System Manager", "HR Manager")
+
+# Cache keys for the exceptional report recipients and the default outgoing sender email
+RECIPIENTS_CACHE_KEY = "biometric_sync_report_recipients"
+SENDER_CACHE_KEY = "biometric_sync_report_sender"
+
+# Lifetime (in seconds) of the cached report recipients and sender
+REPORT_CACHE_TTL = 3600
+
 
 class BiometricDataStaging(Document):
 	pass
@@ -13,41 +29,123 @@ class BiometricDataStaging(Document):
 @frappe.whitelist()
 def enqueue_process_biometric_logs():
     """
-    Enqueue the process_biometric_logs function to run in the background.
+    Enqueue the process_biometric_logs function to run in the background,
+    split into SYNC_SHARDS jobs partitioned by attendance_device_id.
+    A shard that is already queued or running is not enqueued again.
     """
-    frappe.enqueue(
-        'erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.process_biometric_logs',
-        queue='long',
-        job_name='Process Biometric Logs',
-        timeout=3600
-    )
+    for shard in range(SYNC_SHARDS):
+        frappe.enqueue(
+            'erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.process_biometric_logs',
+            queue='long',
+            job_name=f'Process Biometric Logs ({shard + 1}/{SYNC_SHARDS})',
+            job_id=f'process_biometric_logs::{shard}',
+            deduplicate=True,
+            timeout=3600,
+            shard=shard,
+            shards=SYNC_SHARDS
+        )
     return "Employee Checkin synchronization has started in the background."
 
-def process_biometric_logs():
+def process_biometric_logs(shard=None, shards=None):
     """
     Process unsynced logs in Biometric Data Staging Doctype
     and move them to Employee Checkin while updating status.
+    Logs are read in batches ordered by name so memory stays bounded
+    and progress is committed as each batch completes.
+    If shards is given, only logs whose attendance_device_id hashes to
+    the given shard are processed, so shard jobs never share an employee.
+    """
+    last_name = None
+    while True:
+        unsynced_logs = get_pending_logs(last_name, shard, shards)
+        if not unsynced_logs:
+            break
+
+        # Nothing to commit if every log in the batch failed
+        if process_log_batch(unsynced_logs):
+            frappe.db.commit()
+
+        if len(unsynced_logs) < BATCH_SIZE:
+            break
+        last_name = unsynced_logs[-1].name
+
+def get_pending_logs(last_name=None, shard=None, shards=None):
+    """
+    Fetch the next batch of Pending logs after last_name, optionally
+    restricted to one shard of attendance_device_ids.
     """
-    unsynced_logs = frappe.get_all(
-        "Biometric Data Staging",
-        filters={"status": "Pending"},
-        fields=["name", "attendance_device_id", "timestamp", "punch_type", "device_id"]
+    conditions = ["status = 'Pending'"]
+    if last_name:
+        conditions.append("name > %(last_name)s")
+    if shards:
+        conditions.append("MOD(CRC32(attendance_device_id), %(shards)s) = %(shard)s")
+
+    return frappe.db.sql(
+        f"""
+        SELECT name, attendance_device_id, timestamp, punch_type, device_id
+        FROM `tabBiometric Data Staging`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY name ASC
+        LIMIT %(limit)s
+        """,
+        {"last_name": last_name, "shard": shard, "shards": shards, "limit": BATCH_SIZE},
+        as_dict=True,
     )
+
+def process_log_batch(unsynced_logs):
+    """
+    Move a batch of pending logs to Employee Checkin and update their status.
+    Returns the number of logs whose status was updated.
+    """
+    # Resolve all attendance_device_ids to Employees in a single query
+    device_ids = list({log.attendance_device_id for log in unsynced_logs})
+    employee_map = {}
+    if device_ids:
+        employee_map = {
+            row.attendance_device_id: row.name
+            for row in frappe.get_all(
+                "Employee",
+                filters={"attendance_device_id": ["in", device_ids]},
+                fields=["name", "attendance_device_id"]
+            )
+        }
+
+    # Fetch existing Employee Checkins for the candidate (employee, time) pairs in one query
+    candidates = {
+        (employee_map[log.attendance_device_id], log.timestamp)
+        for log in unsynced_logs
+        if log.attendance_device_id in employee_map
+    }
+    existing_checkins = set()
+    if candidates:
+        existing_checkins = {
+            (row.employee, row.time)
+            for row in frappe.get_all(
+                "Employee Checkin",
+                filters={
+                    "employee": ["in", list({employee for employee, _ in candidates})],
+                    "time": ["in", list({time for _, time in candidates})]
+                },
+                fields=["employee", "time"]
+            )
+        }
+
+    # Collect log names per target status and update them in bulk after the loop
+    status_updates = {"Processed": [], "Duplicate": [], "Ignored": []}
+
     for log in unsynced_logs:
         try:
             # Match attendance_device_id to Employee
-            employee = frappe.get_value("Employee", {"attendance_device_id": log.attendance_device_id}, "name")
+            employee = employee_map.get(log.attendance_device_id)
             if employee:
-                # Check for duplicate entries
-                duplicate_check = frappe.db.exists(
-                    "Employee Checkin",
-                    {"employee": employee, "time": log.timestamp}
-                )
-                if duplicate_check:
-                    frappe.db.set_value("Biometric Data Staging", log.name, "status", "Duplicate")
+                # Check for duplicate entries, both existing and earlier in this batch
+                if (employee, log.timestamp) in existing_checkins:
+                    status_updates["Duplicate"].append(log.name)
                     continue
                 
-                # Create Employee Checkin
+                # Create Employee Checkin. This deliberately goes through the document
+                # lifecycle instead of a bulk INSERT: Employee Checkin's validate hook
+                # fetches the employee's shift, which auto attendance depends on.
                 checkin = frappe.get_doc({
                     "doctype": "Employee Checkin",
                     "employee": employee,
@@ -56,20 +154,46 @@ def process_biometric_logs():
                     "device_id": log.device_id
                 })
                 checkin.insert(ignore_permissions=True)
+                # Later logs in this batch with the same (employee, time) are duplicates
+                existing_checkins.add((employee, log.timestamp))
 
                 # Mark log as Processed
-                frappe.db.set_value("Biometric Data Staging", log.name, "status", "Processed")
+                status_updates["Processed"].append(log.name)
             else:
                 # Mark log as Ignored if Employee is not found
-                frappe.db.set_value("Biometric Data Staging", log.name, "status", "Ignored")
+                status_updates["Ignored"].append(log.name)
         except Exception as e:
             frappe.log_error(f"Failed to process log {log.name}: {str(e)}", "Biometric Log Processing Error")
-    frappe.db.commit()
+
+    return sum(update_log_status(names, status) for status, names in status_updates.items())
+
+def update_log_status(names, status):
+    """
+    Set the status of the given Biometric Data Staging logs in a single UPDATE.
+    Only rows still Pending are updated. Returns the number of rows updated.
+    """
+    if not names:
+        return 0
+
+    frappe.db.sql(
+        """
+        UPDATE `tabBiometric Data Staging`
+        SET status = %(status)s, modified = %(modified)s, modified_by = %(user)s
+        WHERE name IN %(names)s
+        AND status = 'Pending'
+        """,
+        {"status": status, "modified": now(), "user": frappe.session.user, "names": tuple(names)}
+    )
+    return frappe.db._cursor.rowcount
 
 def get_recipients_by_roles(roles):
     """
     Fetch email addresses of users assigned to the given roles.
     """
+    # An empty IN () list is invalid SQL
+    if not roles:
+        return []
+
     recipients = frappe.db.sql(
         """
         SELECT DISTINCT u.email
@@ -80,11 +204,49 @@ def get_recipients_by_roles(roles):
         AND hr.role IN %(roles)s
         AND u.email IS NOT NULL
         """,
-        {"roles": roles},
+        {"roles": tuple(roles)},
         as_dict=True,
     )
     return [recipient["email"] for recipient in recipients]
 
+def get_report_recipients():
+    """
+    Fetch email addresses of users with the REPORT_ROLES.
+    The result is cached for REPORT_CACHE_TTL seconds, or until a User
+    changes. An empty result is not cached.
+    """
+    recipients = frappe.cache().get_value(RECIPIENTS_CACHE_KEY)
+    if not recipients:
+        recipients = get_report_recipients()
+        if recipients:
+            frappe.cache().set_value(RECIPIENTS_CACHE_KEY, recipients, expires_in_sec=REPORT_CACHE_TTL)
+    return recipients
+
+def clear_recipients_cache(doc=None, method=None):
+    """
+    Drop cached report recipients, e.g. when a User or their roles change.
+    """
+    frappe.cache().delete_value(RECIPIENTS_CACHE_KEY)
+
+def get_default_sender():
+    """
+    Fetch the email address of the default outgoing Email Account.
+    The result is cached for REPORT_CACHE_TTL seconds, or until an Email
+    Account changes. A missing sender is not cached.
+    """
+    sender = frappe.cache().get_value(SENDER_CACHE_KEY)
+    if not sender:
+        sender = frappe.db.get_value("Email Account", {"default_outgoing": 1}, "email_id")
+        if sender:
+            frappe.cache().set_value(SENDER_CACHE_KEY, sender, expires_in_sec=REPORT_CACHE_TTL)
+    return sender
+
+def clear_sender_cache(doc=None, method=None):
+    """
+    Drop the cached default sender when an Email Account changes.
+    """
+    frappe.cache().delete_value(SENDER_CACHE_KEY)
+
 def send_exceptional_report():
     """
     Generate and email an exceptional report to System Managers and HRs.
@@ -94,7 +256,8 @@ def send_exceptional_report():
         SELECT status, COUNT(*) as count 
         FROM `tabBiometric Data Staging` 
         WHERE status IN ('Pending', 'Ignored', 'Processed') 
-        AND DATE(timestamp) = CURDATE()
+        AND timestamp >= CURDATE()
+        AND timestamp < CURDATE() + INTERVAL 1 DAY
         GROUP BY status
     """, as_dict=True)
 
@@ -104,16 +267,20 @@ def send_exceptional_report():
         return
 
     # Compose email body
-    email_body = "<h3>Exceptional Report Summary</h3>"
-    email_body += "<table border='1' style='border-collapse: collapse;'>"
-    email_body += "<tr><th>Status</th><th>Count</th></tr>"
-    for record in report_data:
-        email_body += f"<tr><td>{record['status']}</td><td>{record['count']}</td></tr>"
-    email_body += "</table>"
+    email_parts = [
+        "<h3>Exceptional Report Summary</h3>",
+        "<table border='1' style='border-collapse: collapse;'>",
+        "<tr><th>Status</th><th>Count</th></tr>",
+    ]
+    email_parts.extend(
+        f"<tr><td>{record['status']}</td><td>{record['count']}</td></tr>"
+        for record in report_data
+    )
+    email_parts.append("</table>")
+    email_body = "".join(email_parts)
 
     # Fetch recipients (System Managers and HRs)
-    roles = ["System Manager", "HR Manager"]
-    recipients = get_recipients_by_roles(roles)
+    recipients = get_report_recipients()
 
     # Log error if no recipients found
     if not recipients:
@@ -122,7 +289,7 @@ def send_exceptional_report():
         return
 
     # Retrieve sender email
-    sender = frappe.db.get_value("Email Account", {"default_outgoing": 1}, "email_id")
+    sender = get_default_sender()
     if not sender:
         frappe.log_error("No default sender email is configured.", "Exceptional Report")
         print("No default sender email is configured.")
@@ -131,19 +298,8 @@ def send_exceptional_report():
     # Email subject and message content
     subject = "Exceptional Report - Biometric Data Staging"
 
-    # Log communication in ERPNext's Communication doctype
-    communication = frappe.get_doc({
-        "doctype": "Communication",
-        "communication_type": "Automated Message",
-        "communication_medium": "Email",
-        "subject": subject,
-        "content": email_body,
-        "sender": sender,
-        "recipients": ", ".join(recipients),
-        "reference_doctype": "Biometric Data Staging",
-        "status": "Linked"
-    })
-    communication.insert(ignore_permissions=True)
+    # Reserved up front so the email can reference its Communication log
+    communication_name = frappe.generate_hash(length=10)
 
     # Send the email
     try:
@@ -153,7 +309,7 @@ def send_exceptional_report():
             sender=sender,
             message=email_body,
             reference_doctype="Communication",
-            reference_name=communication.name,
+            reference_name=communication_name,
             expose_recipients="header"
         )
         print(f"Exceptional report email sent to: {', '.join(recipients)}")
@@ -161,39 +317,69 @@ def send_exceptional_report():
     except Exception as e:
         print(f"Failed to send exceptional report email: {str(e)}")
         frappe.log_error(f"Failed to send email: {str(e)}", "Exceptional Report")
+        return
+
+    # Log communication in ERPNext's Communication doctype once the email is queued.
+    # Inserted without naming, validation or hooks as it is only a log entry
+    try:
+        communication = frappe.new_doc("Communication")
+        communication.update({
+            "communication_type": "Automated Message",
+            "communication_medium": "Email",
+            "subject": subject,
+            "content": email_body,
+            "sender": sender,
+            "recipients": ", ".join(recipients),
+            "reference_doctype": "Biometric Data Staging",
+            "status": "Linked"
+        })
+        communication.name = communication_name
+        communication.set_user_and_timestamp()
+        communication.db_insert()
+    except Exception as e:
+        print(f"Exceptional report email was sent but could not be logged: {str(e)}")
+        frappe.log_error(
+            f"Failed to log Communication {communication_name} for sent email: {str(e)}",
+            "Exceptional Report"
+        )
 
 # ------------------------- Scheduled Jobs -------------------------
-def setup_scheduled_job():
-    """Create or update the scheduled job for biometric data synchronization."""
-    job = frappe.get_doc({
-        "doctype": "Scheduled Job Type",
-        "method": "hrms.hr.doctype.biometric_data_staging.biometric_data_staging.process_biometric_logs",
-        "frequency": "Hourly",  # Runs every hour
+def upsert_scheduled_job(name, method, frequency, description):
+    """Create the named Scheduled Job Type, or update it if it already exists."""
+    job = {
+        "method": method,
+        "frequency": frequency,
         "docstatus": 0,
-        "name": "Hourly Biometric Data Sync",
         "status": "Active",
         "enabled": 1,
         "create_log": 1
-    })
+    }
 
-    try:
-        # Check if the job already exists
-        existing_job = frappe.get_doc("Scheduled Job Type", "Hourly Biometric Data Sync")
+    if frappe.db.exists("Scheduled Job Type", name):
+        existing_job = frappe.get_doc("Scheduled Job Type", name)
         existing_job.update(job)
         existing_job.save()
         frappe.db.commit()
-        print("Updated existing scheduled job for biometric data synchronization.")
-    except frappe.DoesNotExistError:
-        # Create a new job if it doesn't exist
-        job.insert()
+        print(f"Updated existing scheduled job for {description}.")
+    else:
+        frappe.get_doc({"doctype": "Scheduled Job Type", "name": name, **job}).insert()
         frappe.db.commit()
-        print("Created new scheduled job for biometric data synchronization.")
+        print(f"Created new scheduled job for {description}.")
+
+def setup_scheduled_job():
+    """Create or update the scheduled job for biometric data synchronization."""
+    upsert_scheduled_job(
+        "Hourly Biometric Data Sync",
+        "hrms.hr.doctype.biometric_data_staging.biometric_data_staging.process_biometric_logs",
+        "Hourly",  # Runs every hour
+        "biometric data synchronization"
+    )
 
 def execute_scheduled_job():
     """Wrapper function to handle scheduled job execution."""
     try:
-        from erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging import process_biometric_logs
-        process_biometric_logs()
+        from erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging import enqueue_process_biometric_logs
+        enqueue_process_biometric_logs()
     except Exception as e:
         frappe.log_error(
             f"Error in scheduled biometric data synchronization: {str(e)}",
@@ -203,29 +389,12 @@ def execute_scheduled_job():
 
 def setup_scheduled_job_for_exceptional_report():
     """Create or update the scheduled job for sending exceptional reports."""
-    job = frappe.get_doc({
-        "doctype": "Scheduled Job Type",
-        "method": "hrms.hr.doctype.biometric_data_staging.biometric_data_staging.send_exceptional_report",
-        "frequency": "Daily",  # Runs daily
-        "docstatus": 0,
-        "name": "Daily Exceptional Report",
-        "status": "Active",
-        "enabled": 1,
-        "create_log": 1
-    })
-
-    try:
-        # Check if the job already exists
-        existing_job = frappe.get_doc("Scheduled Job Type", "Daily Exceptional Report")
-        existing_job.update(job)
-        existing_job.save()
-        frappe.db.commit()
-        print("Updated existing scheduled job for exceptional report.")
-    except frappe.DoesNotExistError:
-        # Create a new job if it doesn't exist
-        job.insert()
-        frappe.db.commit()
-        print("Created new scheduled job for exceptional report.")
+    upsert_scheduled_job(
+        "Daily Exceptional Report",
+        "hrms.hr.doctype.biometric_data_staging.biometric_data_staging.send_exceptional_report",
+        "Daily",  # Runs daily
+        "exceptional report"
+    )
 
 def execute_scheduled_exceptional_report():
     """Wrapper function to handle scheduled exceptional report execution."""
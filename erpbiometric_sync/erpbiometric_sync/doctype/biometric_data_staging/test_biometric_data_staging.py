@@ -1,9 +1,173 @@
 # Copyright (c) 2025, Joshua Joseph Michael and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime, now_datetime
+
+from erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging import biometric_data_staging
+from erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging import (
+	RECIPIENTS_CACHE_KEY,
+	SENDER_CACHE_KEY,
+	clear_recipients_cache,
+	clear_sender_cache,
+	get_default_sender,
+	get_pending_logs,
+	get_report_recipients,
+	process_log_batch,
+	send_exceptional_report,
+	update_log_status,
+)
 
 
 class TestBiometricDataStaging(FrappeTestCase):
-	pass
+	def tearDown(self):
+		clear_recipients_cache()
+		clear_sender_cache()
+
+	def test_process_log_batch(self):
+		# Employee and Employee Checkin come from ERPNext/HRMS
+		if not frappe.db.exists("DocType", "Employee Checkin"):
+			self.skipTest("HRMS is not installed")
+
+		from erpnext.setup.doctype.employee.test_employee import make_employee
+
+		employee = make_employee("biometric_sync_test@example.com", attendance_device_id="BIO-TEST-001")
+		existing_time = get_datetime("2025-01-06 09:00:00")
+		new_time = get_datetime("2025-01-06 17:00:00")
+
+		frappe.get_doc(
+			{
+				"doctype": "Employee Checkin",
+				"employee": employee,
+				"time": existing_time,
+				"log_type": "IN",
+			}
+		).insert(ignore_permissions=True)
+
+		unknown = make_staging_log("BIO-UNKNOWN-001", new_time)
+		existing = make_staging_log("BIO-TEST-001", existing_time)
+		new = make_staging_log("BIO-TEST-001", new_time)
+		repeated = make_staging_log("BIO-TEST-001", new_time)
+
+		process_log_batch([unknown, existing, new, repeated])
+
+		self.assertEqual(get_status(unknown), "Ignored")
+		self.assertEqual(get_status(existing), "Duplicate")
+		self.assertEqual(get_status(new), "Processed")
+		self.assertEqual(get_status(repeated), "Duplicate")
+		self.assertEqual(frappe.db.count("Employee Checkin", {"employee": employee, "time": new_time}), 1)
+
+	def test_report_recipients_are_cached_until_cleared(self):
+		clear_recipients_cache()
+		recipients = get_report_recipients()
+		self.assertIn("admin@example.com", recipients)
+		self.assertEqual(frappe.cache().get_value(RECIPIENTS_CACHE_KEY), recipients)
+
+		with patch.object(biometric_data_staging, "get_recipients_by_roles") as get_recipients_by_roles:
+			self.assertEqual(get_report_recipients(), recipients)
+			get_recipients_by_roles.assert_not_called()
+
+		clear_recipients_cache()
+		self.assertIsNone(frappe.cache().get_value(RECIPIENTS_CACHE_KEY))
+
+	def test_empty_report_recipients_are_not_cached(self):
+		clear_recipients_cache()
+		with patch.object(biometric_data_staging, "get_recipients_by_roles", return_value=[]):
+			self.assertEqual(get_report_recipients(), [])
+		self.assertIsNone(frappe.cache().get_value(RECIPIENTS_CACHE_KEY))
+
+	def test_default_sender_is_cached_until_cleared(self):
+		with patch.object(frappe.db, "get_value", return_value="reports@example.com") as get_value:
+			clear_sender_cache()
+			self.assertEqual(get_default_sender(), "reports@example.com")
+			self.assertEqual(get_default_sender(), "reports@example.com")
+			get_value.assert_called_once()
+
+		self.assertEqual(frappe.cache().get_value(SENDER_CACHE_KEY), "reports@example.com")
+		clear_sender_cache()
+		self.assertIsNone(frappe.cache().get_value(SENDER_CACHE_KEY))
+
+	def test_missing_default_sender_is_not_cached(self):
+		clear_sender_cache()
+		with patch.object(frappe.db, "get_value", return_value=None):
+			self.assertIsNone(get_default_sender())
+		self.assertIsNone(frappe.cache().get_value(SENDER_CACHE_KEY))
+
+
+	def test_get_pending_logs_pages_and_shards(self):
+		timestamp = get_datetime("2025-01-06 09:00:00")
+		pending = {make_staging_log(f"BIO-SHARD-{i:03}", timestamp).name for i in range(10)}
+		processed = make_staging_log("BIO-SHARD-DONE", timestamp, status="Processed").name
+
+		with patch.object(biometric_data_staging, "BATCH_SIZE", 3):
+			all_logs = fetch_all_pending_logs()
+			shard_logs = [fetch_all_pending_logs(shard, 4) for shard in range(4)]
+
+		self.assertTrue(pending <= all_logs)
+		self.assertNotIn(processed, all_logs)
+		self.assertEqual(set().union(*shard_logs), all_logs)
+		self.assertEqual(sum(len(logs) for logs in shard_logs), len(all_logs))
+
+
+	def test_update_log_status_only_updates_pending_logs(self):
+		timestamp = get_datetime("2025-01-06 09:00:00")
+		pending = make_staging_log("BIO-STATUS-001", timestamp)
+		ignored = make_staging_log("BIO-STATUS-002", timestamp, status="Ignored")
+
+		self.assertEqual(update_log_status([pending.name, ignored.name], "Processed"), 1)
+
+		self.assertEqual(get_status(pending), "Processed")
+		self.assertEqual(get_status(ignored), "Ignored")
+
+
+	def test_no_communication_is_logged_when_sendmail_fails(self):
+		make_staging_log("BIO-REPORT-001", now_datetime())
+		filters = {"reference_doctype": "Biometric Data Staging"}
+		communications = frappe.db.count("Communication", filters)
+
+		with (
+			patch.object(biometric_data_staging, "get_report_recipients", return_value=["hr@example.com"]),
+			patch.object(biometric_data_staging, "get_default_sender", return_value="reports@example.com"),
+			patch("frappe.sendmail", side_effect=Exception("SMTP unavailable")) as sendmail,
+		):
+			send_exceptional_report()
+
+		sendmail.assert_called_once()
+		self.assertEqual(frappe.db.count("Communication", filters), communications)
+
+
+def make_staging_log(attendance_device_id, timestamp, status="Pending"):
+	log = frappe.get_doc(
+		{
+			"doctype": "Biometric Data Staging",
+			"attendance_device_id": attendance_device_id,
+			"timestamp": timestamp,
+			"punch_type": "IN",
+			"device_id": "TEST-DEVICE",
+			"status": status,
+		}
+	).insert(ignore_permissions=True)
+
+	return frappe._dict(
+		name=log.name,
+		attendance_device_id=attendance_device_id,
+		timestamp=get_datetime(timestamp),
+		punch_type=log.punch_type,
+		device_id=log.device_id,
+	)
+
+
+def fetch_all_pending_logs(shard=None, shards=None):
+	"""Page through get_pending_logs the way process_biometric_logs does and collect the names."""
+	names, last_name = set(), None
+	while logs := get_pending_logs(last_name, shard, shards):
+		names.update(log.name for log in logs)
+		last_name = logs[-1].name
+	return names
+
+
+def get_status(log):
+	return frappe.db.get_value("Biometric Data Staging", log.name, "status")
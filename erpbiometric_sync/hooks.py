@@ -83,7 +83,12 @@ app_license = "mit"
 # ------------
 
 # before_install = "erpbiometric_sync.install.before_install"
-# after_install = "erpbiometric_sync.install.after_install"
+after_install = "erpbiometric_sync.install.after_install"
+
+# Migration
+# ------------
+
+after_migrate = "erpbiometric_sync.install.after_migrate"
 
 # Uninstallation
 # ------------
@@ -145,6 +150,17 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+    "User": {
+        "on_update": "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.clear_recipients_cache",
+        "on_trash": "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.clear_recipients_cache"
+    },
+    "Email Account": {
+        "on_update": "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.clear_sender_cache",
+        "on_trash": "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.clear_sender_cache"
+    }
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -244,7 +260,7 @@ app_license = "mit"
 
 scheduler_events = {
     "hourly": [
-        "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.process_biometric_logs"
+        "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.enqueue_process_biometric_logs"
     ],
     "daily": [
         "erpbiometric_sync.erpbiometric_sync.doctype.biometric_data_staging.biometric_data_staging.send_exceptional_report"
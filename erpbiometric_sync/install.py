@@ -0,0 +1,43 @@
+# Copyright (c) 2025, Joshua Joseph Michael and contributors
+# For license information, please see license.txt
+
+import frappe
+
+# Indexes backing the duplicate check in process_biometric_logs
+# and the daily status counts in send_exceptional_report.
+# Employee.attendance_device_id is unique in ERPNext and already indexed.
+INDEXES = [
+    ("Biometric Data Staging", ["status", "timestamp"], "status_timestamp_index"),
+    ("Employee Checkin", ["employee", "time"], "employee_time_index"),
+]
+
+
+def after_install():
+    add_indexes()
+
+
+def after_migrate():
+    add_indexes()
+
+
+def add_indexes():
+    """Add the indexes used by biometric data synchronization if they are missing."""
+    for doctype, fields, index_name in INDEXES:
+        # Employee Checkin comes from HRMS and may not be installed
+        if not frappe.db.table_exists(doctype):
+            continue
+        if has_index(doctype, fields):
+            continue
+        frappe.db.add_index(doctype, fields, index_name=index_name)
+
+
+def has_index(doctype, fields):
+    """Check whether an existing index on the doctype's table starts with the given columns, in order."""
+    index_columns = {}
+    for row in frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}`", as_dict=True):
+        index_columns.setdefault(row.Key_name, {})[row.Seq_in_index] = row.Column_name
+
+    return any(
+        [columns[seq] for seq in sorted(columns)][: len(fields)] == list(fields)
+        for columns in index_columns.values()
+    )